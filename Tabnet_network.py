@@ -1,5 +1,8 @@
+import math
+import warnings
 import torch
-from torch.nn import Linear, BatchNorm1d, ReLU
+import torch.nn.functional as F
+from torch.nn import Linear, BatchNorm1d
 import numpy as np
 #import sparsemax
 from torch.autograd import Function
@@ -19,35 +22,63 @@ def initialize_glu(module, inp_dim, out_dim):
     # torch.nn.init.zeros_(module.bias)
     return
 
-def make_ix_like(input, dim = 0):
+# rank tensors of make_ix_like, keyed by (d, ndim, dim, device, dtype)
+_ix_cache = {}
+
+
+def _arange_ix_like(input, dim = 0):
     d = input.size(dim)
     rho = torch.arange(1, d + 1, device = input.device, dtype = input.dtype)
     view = [1] * input.dim()
     view[0] = -1
     return rho.view(view).transpose(0, dim)
 
+
+def make_ix_like(input, dim = 0):
+    if torch.compiler.is_compiling():
+        # a traced tensor must not leak into the global cache,
+        # inductor constant-folds the arange anyway
+        return _arange_ix_like(input, dim)
+    key = (input.size(dim), input.dim(), dim, input.device, input.dtype)
+    rho = _ix_cache.get(key)
+    if rho is None:
+        rho = _ix_cache.setdefault(key, _arange_ix_like(input, dim))
+    return rho
+
 class SparsemaxFunction(Function): #sparsemax activation
     @staticmethod
-    def forward(ctx, input, dim = -1):
+    def forward(ctx, input, dim = -1, use_compile = False):
         ctx.dim = dim
+        # the threshold search is done in float32, even under autocast
+        ctx.dtype = input.dtype
+        input = input.float()
+        if use_compile:
+            output, supp_size = compiled_sparsemax_forward(input, dim = dim)
+        else:
+            output, supp_size = SparsemaxFunction.sparsemax_forward(input, dim = dim)
+        ctx.save_for_backward(supp_size, output)
+        return output.to(ctx.dtype)
+
+    @staticmethod
+    def sparsemax_forward(input, dim = -1):
         max_val, _ = input.max (dim = dim, keepdim = True)
-        input -= max_val
+        # out of place, the caller's tensor must not be modified
+        input = input - max_val
         tau, supp_size = SparsemaxFunction.threshold_and_support(input, dim = dim)
         output = torch.clamp(input - tau, min = 0)
-        ctx.save_for_backward(supp_size, output)
-        return output
+        return output, supp_size
     
     @staticmethod
     def backward(ctx, grad_output):
         supp_size, output = ctx.saved_tensors
         dim = ctx.dim
-        grad_input = grad_output.clone()
-        grad_input[output == 0] = 0
+        # gradients only flow through the support of the output
+        mask = output != 0
+        grad_input = grad_output.to(output.dtype) * mask
 
-        v_hat = grad_input.sum(dim = dim) / supp_size.to(output.dtype).squeeze()
-        v_hat = v_hat.unsqueeze(dim)
-        grad_input = torch.where(output != 0, grad_input - v_hat, grad_input)
-        return grad_input, None
+        v_hat = grad_input.sum(dim = dim, keepdim = True) / supp_size.to(output.dtype)
+        grad_input = grad_input - v_hat * mask
+        return grad_input.to(ctx.dtype), None, None
 
     @staticmethod
     def threshold_and_support(input, dim = -1):
@@ -62,16 +93,19 @@ class SparsemaxFunction(Function): #sparsemax activation
         return tau, support_size
 
 sparsemax = SparsemaxFunction.apply
+# sort is kept, inductor fuses the max/cumsum/threshold/clamp passes around it
+compiled_sparsemax_forward = torch.compile(SparsemaxFunction.sparsemax_forward)
 
 
 class Sparsemax(torch.nn.Module):
 
-    def __init__(self, dim=-1):
+    def __init__(self, dim=-1, use_compile=False):
         self.dim = dim
+        self.use_compile = use_compile
         super(Sparsemax, self).__init__()
 
     def forward(self, input):
-        return sparsemax(input, self.dim)
+        return sparsemax(input, self.dim, self.use_compile)
 
 class GBN(torch.nn.Module):
     """
@@ -87,10 +121,125 @@ class GBN(torch.nn.Module):
         self.bn = BatchNorm1d(self.inp_dim, momentum=momentum)
 
     def forward(self, x):
-        chunks = x.chunk(int(np.ceil(x.shape[0] / self.vbs)), 0)
-        res = [self.bn(x_) for x_ in chunks]
+        # integer ceil divisions : a compiled caller only guards on the branches,
+        # not on the float ratio of each batch size
+        n_chunks = -(-x.shape[0] // self.vbs)
+        if not self.training or n_chunks <= 1:
+            # running statistics are shared by all virtual batches
+            return self.bn(x)
+
+        # same split as x.chunk(n_chunks) : equal ghost batches and a tail
+        chunk_size = -(-x.shape[0] // n_chunks)
+        n_full = x.shape[0] // chunk_size
+        ghosts = x[: n_full * chunk_size].view(n_full, chunk_size, self.inp_dim)
+        tail = x[n_full * chunk_size :]
+
+        # normalize all ghost batches at once, each one seen as its own channels
+        res = F.batch_norm(
+            ghosts.transpose(0, 1).reshape(chunk_size, n_full * self.inp_dim),
+            None,
+            None,
+            weight=self.bn.weight.repeat(n_full),
+            bias=self.bn.bias.repeat(n_full),
+            training=True,
+            eps=self.bn.eps,
+        )
+        res = res.view(chunk_size, n_full, self.inp_dim).transpose(0, 1)
+        res = res.reshape(n_full * chunk_size, self.inp_dim)
+        self._update_running_stats(ghosts)
+
+        if tail.shape[0] == 0:
+            return res
+        return torch.cat([res, self.bn(tail)], dim=0)
+
+    @torch.no_grad()
+    def _update_running_stats(self, ghosts):
+        """
+        Update running statistics as if each ghost batch went through self.bn
+        one after the other.
+        """
+        # statistics are accumulated in float32, even under autocast
+        ghosts = ghosts.float()
+        n_full = ghosts.shape[0]
+        momentum = self.bn.momentum
+        powers = torch.arange(n_full - 1, -1, -1, device=ghosts.device)
+        weights = momentum * (1 - momentum) ** powers.to(ghosts.dtype)
+        decay = (1 - momentum) ** n_full
+
+        self.bn.running_mean.mul_(decay).add_(weights @ ghosts.mean(dim=1))
+        self.bn.running_var.mul_(decay).add_(weights @ ghosts.var(dim=1))
+        self.bn.num_batches_tracked.add_(n_full)
+
+class SharedFeatTransform(torch.nn.Module):
+    """
+    Fully connected layers shared by the feature transformers of every step.
+    The first layer has its own weight, the following ones are stacked in a
+    single contiguous parameter.
+    """
+
+    def __init__(self, inp_dim, out_dim, n_shared):
+        super(SharedFeatTransform, self).__init__()
+        self.n_shared = n_shared
+        self.first_weight = torch.nn.Parameter(torch.empty(2 * out_dim, inp_dim))
+        if n_shared > 1:
+            self.weights = torch.nn.Parameter(
+                torch.empty(n_shared - 1, 2 * out_dim, out_dim)
+            )
+        else:
+            # no empty parameter, it would never get a gradient
+            self.register_parameter("weights", None)
+        self.layers = [SharedLinear(self, i) for i in range(n_shared)]
+        # same random draws as the Linear layers this module replaces,
+        # seeded models keep their initial weights
+        with torch.no_grad():
+            for idx in range(n_shared):
+                torch.nn.init.kaiming_uniform_(self.layer_weight(idx), a=math.sqrt(5))
+        self._register_load_state_dict_pre_hook(self._stack_legacy_weights)
+
+    def layer_weight(self, idx):
+        return self.first_weight if idx == 0 else self.weights[idx - 1]
+
+    def __len__(self):
+        return self.n_shared
+
+    def __getitem__(self, idx):
+        return self.layers[idx]
+
+    def _stack_legacy_weights(self, state_dict, prefix, *args):
+        # checkpoints saved with one Linear per shared layer
+        if prefix + "0.weight" not in state_dict:
+            return
+        first, *others = [
+            state_dict.pop(f"{prefix}{i}.weight") for i in range(self.n_shared)
+        ]
+        state_dict[prefix + "first_weight"] = first
+        if others:
+            state_dict[prefix + "weights"] = torch.stack(others)
+
+
+class SharedLinear(torch.nn.Module):
+    """
+    One layer of a SharedFeatTransform, used as the fc of a GLU_Layer.
+    """
+
+    def __init__(self, shared, idx):
+        super(SharedLinear, self).__init__()
+        # plain reference : parameters are registered by the owner of `shared`
+        self._shared = [shared]
+        self.idx = idx
+        self._register_load_state_dict_pre_hook(self._drop_legacy_weight)
+
+    @property
+    def weight(self):
+        return self._shared[0].layer_weight(self.idx)
+
+    def forward(self, x):
+        return F.linear(x, self.weight)
+
+    def _drop_legacy_weight(self, state_dict, prefix, *args):
+        # the same tensor is loaded through SharedFeatTransform
+        state_dict.pop(prefix + "weight", None)
 
-        return torch.cat(res, dim=0)
 
 class GLU_Layer(torch.nn.Module):
     def __init__(
@@ -109,10 +258,12 @@ class GLU_Layer(torch.nn.Module):
             2 * out_dim, vbs=vbs, momentum=momentum
         )
 
+
     def forward(self, x):
         x = self.fc(x)
         x = self.bn(x)
-        out = torch.mul(x[:, : self.out_dim], torch.sigmoid(x[:, self.out_dim :]))
+        # x[:, :out_dim] * sigmoid(x[:, out_dim:]) in a single kernel
+        out = F.glu(x, dim=-1)
         return out
 
 class GLU_Block(torch.nn.Module):
@@ -144,8 +295,9 @@ class GLU_Block(torch.nn.Module):
             fc = shared_layers[glu_id] if shared_layers else None
             self.glu_layers.append(GLU_Layer(out_dim, out_dim, fc=fc, **params))
 
+        self.register_buffer("scale", torch.tensor(0.5).sqrt(), persistent=False)
+
     def forward(self, x):
-        scale = torch.sqrt(torch.FloatTensor([0.5]).to(x.device))
         if self.first:  # the first layer of the block has no scale multiplication
             x = self.glu_layers[0](x)
             layers_left = range(1, self.n_glu)
@@ -153,8 +305,7 @@ class GLU_Block(torch.nn.Module):
             layers_left = range(self.n_glu)
 
         for glu_id in layers_left:
-            x = torch.add(x, self.glu_layers[glu_id](x))
-            x = x * scale
+            x = torch.add(x, self.glu_layers[glu_id](x)).mul_(self.scale)
         return x
 
 class AttentiveTransformer(torch.nn.Module):
@@ -165,6 +316,7 @@ class AttentiveTransformer(torch.nn.Module):
         vbs=128,
         momentum=0.02,
         #mask_type="sparsemax",
+        use_compile=False,
     ):
         """
         Initialize an attention transformer.
@@ -181,6 +333,8 @@ class AttentiveTransformer(torch.nn.Module):
             Float value between 0 and 1 which will be used for momentum in batch norm
         mask_type : str
             Either "sparsemax" or "entmax" : this is the masking function to use
+        use_compile : bool
+            Whether to compile the sparsemax forward with torch.compile
         """
         super(AttentiveTransformer, self).__init__()
         self.fc = Linear(inp_dim, out_dim, bias=False)
@@ -191,7 +345,7 @@ class AttentiveTransformer(torch.nn.Module):
 
         #if mask_type == "sparsemax":
             # Sparsemax
-        self.selector = Sparsemax(dim=-1)
+        self.selector = Sparsemax(dim=-1, use_compile=use_compile)
         #elif mask_type == "entmax":
             # Entmax
         #    self.selector = sparsemax.Entmax15(dim=-1)
@@ -288,6 +442,7 @@ class TabNetEncoder(torch.nn.Module):
         vbs=128,
         momentum=0.02,
        #mask_type="sparsemax",
+        use_compile=False,
     ):
         """
         Defines main part of the TabNet network without the embedding layers.
@@ -319,6 +474,8 @@ class TabNetEncoder(torch.nn.Module):
             Float value between 0 and 1 which will be used for momentum in all batch norm
         mask_type : str
             Either "sparsemax" or "entmax" : this is the masking function to use
+        use_compile : bool
+            Whether to compile the encoder pass and sparsemax with torch.compile
         """
         super(TabNetEncoder, self).__init__()
         self.inp_dim = inp_dim
@@ -329,6 +486,9 @@ class TabNetEncoder(torch.nn.Module):
         self.n_steps = n_steps
         self.gamma = gamma
         self.epsilon = epsilon
+        # scalar constants of the step loop, kept out of the state_dict
+        self.register_buffer("gamma_t", torch.tensor(float(gamma)), persistent=False)
+        self.register_buffer("epsilon_t", torch.tensor(float(epsilon)), persistent=False)
         self.n_ind = n_ind
         self.n_shared = n_shared
         self.vbs = vbs
@@ -336,17 +496,9 @@ class TabNetEncoder(torch.nn.Module):
         self.initial_bn = BatchNorm1d(self.inp_dim, momentum=0.01)
 
         if self.n_shared > 0:
-            shared_feat_transform = torch.nn.ModuleList()
-            for i in range(self.n_shared):
-                if i == 0:
-                    shared_feat_transform.append(
-                        Linear(self.inp_dim, 2 * (n_d + n_a), bias=False)
-                    )
-                else:
-                    shared_feat_transform.append(
-                        Linear(n_d + n_a, 2 * (n_d + n_a), bias=False)
-                    )
-
+            shared_feat_transform = SharedFeatTransform(
+                self.inp_dim, n_d + n_a, self.n_shared
+            )
         else:
             shared_feat_transform = None
 
@@ -377,63 +529,128 @@ class TabNetEncoder(torch.nn.Module):
                 vbs=self.vbs,
                 momentum=momentum,
                 #mask_type=self.mask_type,
+                use_compile=use_compile,
             )
             self.feat_transformers.append(transformer)
             self.att_transformers.append(attention)
 
+        self.use_compile = use_compile
+        if self.use_compile:
+            # one graph for the whole pass : the steps are unrolled and inductor
+            # fuses the pointwise chain of each of them
+            self._encode = torch.compile(self._encode)
+        self.is_graphed = False
+        self.graphed_shape = None
+
+    def __getstate__(self):
+        state = super(TabNetEncoder, self).__getstate__()
+        # the compiled _encode can't be pickled, __setstate__ builds it again
+        state.pop("_encode", None)
+        # neither can the graphed forward, copies train eagerly
+        state.pop("forward", None)
+        state["is_graphed"] = False
+        state["graphed_shape"] = None
+        return state
+
+    def __setstate__(self, state):
+        super(TabNetEncoder, self).__setstate__(state)
+        if self.__dict__.get("use_compile", False):
+            self._encode = torch.compile(self._encode)
+
+    def _step(self, att_transformer, feat_transformer, prior, att, x):
+        # the step modules are passed rather than indexed with the step number,
+        # a traced _step does not specialize on the step index
+        M = att_transformer(prior, att)
+        # xlogy skips the log on the zeros of the sparsemax output
+        M_loss = torch.special.xlogy(M, M + self.epsilon_t).sum(dim=1).mean()
+        # update prior
+        prior = torch.mul(self.gamma_t - M, prior)
+        # output
+        masked_x = torch.mul(M, x)
+        out = feat_transformer(masked_x)
+        # att is the update of the attention
+        d, att = out.split_with_sizes([self.n_d, self.n_a], dim=1)
+        d = F.relu(d)
+        return M, d, prior, att, M_loss
+
     def forward(self, x, prior=None):
+        return self._encode(x, prior)
+
+    def _encode(self, x, prior=None):
         x = self.initial_bn(x)
 
         if prior is None:
-            prior = torch.ones(x.shape).to(x.device)
+            prior = torch.ones_like(x)
 
         M_loss = 0
-        att = self.initial_splitter(x)[:, self.n_d :]
-
-        steps_output = []
-        for step in range(self.n_steps):
-            M = self.att_transformers[step](prior, att)
-            M_loss += torch.mean(
-                torch.sum(torch.mul(M, torch.log(M + self.epsilon)), dim=1)
+        _, att = self.initial_splitter(x).split_with_sizes([self.n_d, self.n_a], dim=1)
+
+        res = torch.zeros(x.shape[0], self.n_d, device=x.device, dtype=x.dtype)
+        for att_transformer, feat_transformer in zip(
+            self.att_transformers, self.feat_transformers
+        ):
+            _, d, prior, att, step_loss = self._step(
+                att_transformer, feat_transformer, prior, att, x
             )
-            # update prior
-            prior = torch.mul(self.gamma - M, prior)
-            # output
-            masked_x = torch.mul(M, x)
-            out = self.feat_transformers[step](masked_x)
-            d = ReLU()(out[:, : self.n_d])
-            steps_output.append(d)
-            # update attention
-            att = out[:, self.n_d :]
+            M_loss += step_loss
+            res.add_(d)
 
         M_loss /= self.n_steps
-        return steps_output, M_loss
+        return res, M_loss
 
     def forward_masks(self, x):
         x = self.initial_bn(x)
 
-        prior = torch.ones(x.shape).to(x.device)
-        M_explain = torch.zeros(x.shape).to(x.device)
-        att = self.initial_splitter(x)[:, self.n_d :]
+        prior = torch.ones_like(x)
+        M_explain = torch.zeros_like(x)
+        _, att = self.initial_splitter(x).split_with_sizes([self.n_d, self.n_a], dim=1)
         masks = {}
 
         for step in range(self.n_steps):
-            M = self.att_transformers[step](prior, att)
+            M, d, prior, att, _ = self._step(
+                self.att_transformers[step], self.feat_transformers[step], prior, att, x
+            )
             masks[step] = M
-            # update prior
-            prior = torch.mul(self.gamma - M, prior)
-            # output
-            masked_x = torch.mul(M, x)
-            out = self.feat_transformers[step](masked_x)
-            d = ReLU()(out[:, : self.n_d])
             # explain
             step_importance = torch.sum(d, dim=1)
             M_explain += torch.mul(M, step_importance.unsqueeze(dim=1))
-            # update attention
-            att = out[:, self.n_d :]
 
         return M_explain, masks
 
+    def make_graphed(self, sample_x):
+        """
+        Capture the training forward and backward passes in CUDA graphs.
+        Experimental, it has not been validated against eager training yet.
+
+        Once captured, every call in training mode replays the graphs instead of
+        launching each kernel of the n_steps loop, eval mode stays eager.
+        All training inputs must then share the shape of sample_x, a sample of
+        another shape captures the graphs again.
+
+        Parameters
+        ----------
+        sample_x : torch.Tensor
+            Sample CUDA input, with the same shape and requires_grad as training inputs
+        """
+        if self.is_graphed:
+            if sample_x.shape == self.graphed_shape:
+                return self
+            # back to the eager forward, the graphs are captured for the new shape
+            del self.forward
+            self.is_graphed = False
+
+        # warmup and capture run training passes which update the batch norm
+        # statistics, they are restored in place to keep the captured addresses
+        buffers = {name: buffer.clone() for name, buffer in self.named_buffers()}
+        torch.cuda.make_graphed_callables(self, (sample_x,))
+        with torch.no_grad():
+            for name, buffer in self.named_buffers():
+                buffer.copy_(buffers[name])
+
+        self.graphed_shape = sample_x.shape
+        self.is_graphed = True
+        return self
+
 class EmbeddingGenerator(torch.nn.Module):
     """
     Classical embeddings generator
@@ -499,6 +716,30 @@ class EmbeddingGenerator(torch.nn.Module):
         self.continuous_idx = torch.ones(inp_dim, dtype=torch.bool)
         self.continuous_idx[cat_idxs] = 0
 
+        # gather indices, kept out of the state_dict
+        self.register_buffer(
+            "cont_idx", torch.nonzero(self.continuous_idx).squeeze(1), persistent=False
+        )
+        self.register_buffer(
+            "cat_idx", torch.tensor(np.sort(cat_idxs), dtype=torch.long), persistent=False
+        )
+        # position of each output column in [continuous, embeddings]
+        n_cont = len(self.cont_idx)
+        emb_starts = n_cont + np.cumsum([0] + self.cat_emb_dims[:-1])
+        post_embed_idx = []
+        cont_counter, cat_counter = 0, 0
+        for is_continuous in self.continuous_idx:
+            if is_continuous:
+                post_embed_idx.append(cont_counter)
+                cont_counter += 1
+            else:
+                start = emb_starts[cat_counter]
+                post_embed_idx.extend(range(start, start + self.cat_emb_dims[cat_counter]))
+                cat_counter += 1
+        self.register_buffer(
+            "post_embed_idx", torch.tensor(post_embed_idx, dtype=torch.long), persistent=False
+        )
+
     def forward(self, x):
         """
         Apply embeddings to inputs
@@ -509,19 +750,16 @@ class EmbeddingGenerator(torch.nn.Module):
             # no embeddings required
             return x
 
-        cols = []
-        cat_feat_counter = 0
-        for feat_init_idx, is_continuous in enumerate(self.continuous_idx):
-            # Enumerate through continuous idx boolean mask to apply embeddings
-            if is_continuous:
-                cols.append(x[:, feat_init_idx].float().view(-1, 1))
-            else:
-                cols.append(
-                    self.embeddings[cat_feat_counter](x[:, feat_init_idx].long())
-                )
-                cat_feat_counter += 1
-        # concat
-        post_embeddings = torch.cat(cols, dim=1)
+        cont_cols = x.index_select(1, self.cont_idx).float()
+        cat_cols = x.index_select(1, self.cat_idx).long()
+        # one lookup per table : a concatenated table would be copied at
+        # every forward and get a gradient the size of the whole vocabulary
+        embedded = torch.cat(
+            [emb(cat_cols[:, i]) for i, emb in enumerate(self.embeddings)], dim=1
+        )
+        # restore the original column order
+        post_embeddings = torch.cat([cont_cols, embedded], dim=1)
+        post_embeddings = post_embeddings.index_select(1, self.post_embed_idx)
         return post_embeddings
 
 class TabNetNoEmbeddings(torch.nn.Module):
@@ -539,6 +777,7 @@ class TabNetNoEmbeddings(torch.nn.Module):
         vbs=128,
         momentum=0.02,
         #mask_type="sparsemax",
+        use_compile=False,
     ):
         """
         Defines main part of the TabNet network without the embedding layers.
@@ -570,6 +809,8 @@ class TabNetNoEmbeddings(torch.nn.Module):
             Float value between 0 and 1 which will be used for momentum in all batch norm
         mask_type : str
             Either "sparsemax" or "entmax" : this is the masking function to use
+        use_compile : bool
+            Whether to compile the encoder pass and sparsemax with torch.compile
         """
         super(TabNetNoEmbeddings, self).__init__()
         self.inp_dim = inp_dim
@@ -584,7 +825,10 @@ class TabNetNoEmbeddings(torch.nn.Module):
         self.n_shared = n_shared
         self.vbs = vbs
         #self.mask_type = mask_type
+        # not used in forward, the encoder has its own initial_bn : kept for
+        # the state_dict but frozen, DDP fails on parameters without gradients
         self.initial_bn = BatchNorm1d(self.inp_dim, momentum=0.01)
+        self.initial_bn.requires_grad_(False)
 
         self.encoder = TabNetEncoder(
             inp_dim=inp_dim,
@@ -599,6 +843,7 @@ class TabNetNoEmbeddings(torch.nn.Module):
             vbs=vbs,
             momentum=momentum,
             #mask_type=mask_type,
+            use_compile=use_compile,
         )
 
         if self.is_multi_task:
@@ -612,9 +857,7 @@ class TabNetNoEmbeddings(torch.nn.Module):
             initialize_non_glu(self.final_mapping, n_d, out_dim)
 
     def forward(self, x):
-        res = 0
-        steps_output, M_loss = self.encoder(x)
-        res = torch.sum(torch.stack(steps_output, dim=0), dim=0)
+        res, M_loss = self.encoder(x)
 
         if self.is_multi_task:
             # Result will be in list format
@@ -647,6 +890,7 @@ class TabNet(torch.nn.Module):
         vbs=128,
         momentum=0.02,
         #mask_type="sparsemax",
+        use_compile=False,
     ):
         """
         Defines TabNet network
@@ -686,6 +930,8 @@ class TabNet(torch.nn.Module):
             Float value between 0 and 1 which will be used for momentum in all batch norm
         mask_type : str
             Either "sparsemax" or "entmax" : this is the masking function to use
+        use_compile : bool
+            Whether to compile the encoder pass and sparsemax with torch.compile
         """
         super(TabNet, self).__init__()
         self.cat_idxs = cat_idxs or []
@@ -702,6 +948,7 @@ class TabNet(torch.nn.Module):
         self.n_ind = n_ind
         self.n_shared = n_shared
         #self.mask_type = mask_type
+        self.use_compile = use_compile
 
         if self.n_steps <= 0:
             raise ValueError("n_steps should be a positive integer.")
@@ -724,15 +971,107 @@ class TabNet(torch.nn.Module):
             vbs,
             momentum,
             #mask_type,
+            use_compile=use_compile,
         )
+        # CUDA graph of the inference forward, see compile_inference
+        self._graph = None
+        self._static_in = None
+        self._static_out = None
+
+    def __getstate__(self):
+        state = super(TabNet, self).__getstate__()
+        # the CUDA graph and its static tensors are not copied,
+        # copies run eagerly until compile_inference is called on them
+        state["_graph"] = None
+        state["_static_in"] = None
+        state["_static_out"] = None
+        return state
 
     def forward(self, x):
+        """
+        Mixed precision is supported by calling the network under
+        torch.autocast(device_type, dtype=torch.bfloat16) : linear layers run in
+        bfloat16 while batch norm statistics and sparsemax stay in float32.
+        """
+        if self._can_replay(x):
+            self._static_in.copy_(x)
+            self._graph.replay()
+            out, M_loss = self._static_out
+            if isinstance(out, list):
+                out = [task_out.clone() for task_out in out]
+            else:
+                out = out.clone()
+            return out, M_loss.clone()
+
         x = self.embedder(x)
         return self.tabnet(x)
 
+    def compile_inference(self, example_x):
+        """
+        Capture the inference forward pass in a CUDA graph.
+        Experimental, it has not been validated against eager inference yet.
+
+        The network is set to eval mode. Later calls in eval mode, with gradients
+        disabled and an input of the same shape, dtype and device as example_x
+        replay the graph, any other call runs eagerly.
+
+        Parameters
+        ----------
+        example_x : torch.Tensor
+            Input batch on a CUDA device
+        """
+        warnings.warn(
+            "compile_inference is experimental, CUDA graph inference has not been "
+            "validated against eager inference yet."
+        )
+        self.eval()
+        self._graph = None
+        static_in = example_x.detach().clone()
+
+        # warmup on a side stream, as required before capture
+        stream = torch.cuda.Stream(device=static_in.device)
+        stream.wait_stream(torch.cuda.current_stream(static_in.device))
+        with torch.no_grad(), torch.cuda.stream(stream):
+            for _ in range(3):
+                self(static_in)
+        torch.cuda.current_stream(static_in.device).wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.no_grad(), torch.cuda.graph(graph):
+            static_out = self(static_in)
+
+        self._static_in = static_in
+        self._static_out = static_out
+        self._graph = graph
+
+    def _can_replay(self, x):
+        return (
+            self._graph is not None
+            and not self.training
+            and not torch.is_grad_enabled()
+            and x.shape == self._static_in.shape
+            and x.dtype == self._static_in.dtype
+            and x.device == self._static_in.device
+        )
+
     def forward_masks(self, x):
         x = self.embedder(x)
         return self.tabnet.forward_masks(x)
 
+    def make_graphed_encoder(self, x):
+        """
+        Capture the encoder training steps in CUDA graphs.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            Sample CUDA batch, every training batch must have the same shape
+        """
+        with torch.no_grad():
+            sample_x = self.embedder(x)
+        # embedding outputs carry gradients during training
+        sample_x.requires_grad_(not self.embedder.skip_embedding)
+        self.tabnet.encoder.make_graphed(sample_x)
+
 
 
@@ -17,6 +17,7 @@ from utils import (
     check_warm_start
 )
 from callbacks import (
+    BatchLog,
     CallbackContainer,
     History,
     EarlyStopping,
@@ -64,6 +65,10 @@ class TabModel(BaseEstimator):
     device_name: str = "auto"
     n_shared_decoder: int = 1
     n_indep_decoder: int = 1
+    use_compile: bool = False
+    # experimental, see _set_cuda_graph
+    use_cuda_graph: bool = False
+    mixed_precision: bool = False
 
     def __post_init__(self):
         self.batch_size = 1024
@@ -222,6 +227,8 @@ class TabModel(BaseEstimator):
             # model has never been fitted before of warm_start is False
             self._set_network()
         self._update_network_params()
+        if self.use_cuda_graph:
+            self._set_cuda_graph(X_train)
         self._set_metrics(eval_metric, eval_names)
         self._set_optimizer()
         self._set_callbacks(callbacks)
@@ -236,7 +243,7 @@ class TabModel(BaseEstimator):
         for epoch_idx in range(self.max_epochs):
 
             # Call method on_epoch_begin for all callbacks
-            self._callback_container.on_epoch_begin(epoch_idx)
+            self._callback_container.on_epoch_begin(epoch_idx, logs={})
 
             self._train_epoch(train_dataloader)
 
@@ -283,7 +290,8 @@ class TabModel(BaseEstimator):
         results = []
         for batch_nb, data in enumerate(dataloader):
             data = data.to(self.device).float()
-            output, M_loss = self.network(data)
+            with torch.no_grad():
+                output, M_loss = self.network(data)
             predictions = output.cpu().detach().numpy()
             results.append(predictions)
         res = np.vstack(results)
@@ -453,7 +461,7 @@ class TabModel(BaseEstimator):
         self.network.train()
 
         for batch_idx, (X, y) in enumerate(train_loader):
-            self._callback_container.on_batch_begin(batch_idx)
+            self._callback_container.on_batch_begin(batch_idx, logs={})
 
             batch_logs = self._train_batch(X, y)
 
@@ -479,10 +487,10 @@ class TabModel(BaseEstimator):
         -------
         batch_outs : dict
             Dictionnary with "y": target and "score": prediction scores.
-        batch_logs : dict
-            Dictionnary with "batch_size" and "loss".
+        batch_logs : BatchLog
+            Batch size and loss of the batch.
         """
-        batch_logs = {"batch_size": X.shape[0]}
+        batch_size = X.shape[0]
 
         X = X.to(self.device).float()
         y = y.to(self.device).float()
@@ -493,9 +501,9 @@ class TabModel(BaseEstimator):
         for param in self.network.parameters():
             param.grad = None
 
-        output, M_loss = self.network(X)
-
-        loss = self.compute_loss(output, y)
+        with self._autocast():
+            output, M_loss = self.network(X)
+            loss = self.compute_loss(output, y)
         # Add the overall sparsity loss
         loss = loss - self.lambda_sparse * M_loss
 
@@ -505,10 +513,21 @@ class TabModel(BaseEstimator):
             clip_grad_norm_(self.network.parameters(), self.clip_value)
         self._optimizer.step()
 
-        batch_logs["loss"] = loss.cpu().detach().numpy().item()
+        batch_logs = BatchLog(batch_size, loss.cpu().detach().numpy().item())
 
         return batch_logs
 
+    def _autocast(self):
+        """Autocast context for training, in bfloat16 if mixed_precision is set."""
+        # the cast cache keeps the shared weights from being cast at every step,
+        # but it must be disabled for CUDA graph captures
+        return torch.autocast(
+            device_type=self.device.type,
+            dtype=torch.bfloat16,
+            enabled=self.mixed_precision,
+            cache_enabled=not self.use_cuda_graph,
+        )
+
     def _predict_epoch(self, name, loader):
         """
         Predict an epoch and update metrics.
@@ -556,7 +575,8 @@ class TabModel(BaseEstimator):
         X = X.to(self.device).float()
 
         # compute model output
-        scores, _ = self.network(X)
+        with torch.no_grad():
+            scores, _ = self.network(X)
 
         if isinstance(scores, list):
             scores = [x.cpu().detach().numpy() for x in scores]
@@ -584,6 +604,7 @@ class TabModel(BaseEstimator):
             vbs=self.vbs,
             momentum=self.momentum,
             #mask_type=self.mask_type,
+            use_compile=self.use_compile,
         ).to(self.device)
 
         self.reducing_matrix = create_explain_matrix(
@@ -593,6 +614,33 @@ class TabModel(BaseEstimator):
             self.network.post_embed_dim,
         )
 
+    def _set_cuda_graph(self, X_train):
+        """Capture the encoder training steps in CUDA graphs.
+
+        Experimental : the capture has not been validated against eager
+        training on CUDA devices yet.
+
+        Parameters
+        ----------
+        X_train : np.ndarray
+            Train set, its first batch is used for the capture.
+
+        """
+        if self.device.type != "cuda":
+            warnings.warn("use_cuda_graph is only available on cuda devices, ignoring it.")
+            return
+        if not self.drop_last:
+            msg = "use_cuda_graph requires drop_last=True to keep training batches of a fixed shape."
+            raise ValueError(msg)
+        warnings.warn(
+            "use_cuda_graph is experimental, training with CUDA graphs has not been "
+            "validated against eager training yet."
+        )
+        sample = torch.from_numpy(X_train[: self.batch_size]).to(self.device).float()
+        self.network.train()
+        with self._autocast():
+            self.network.make_graphed_encoder(sample)
+
     def _set_metrics(self, metrics, eval_names):
         """Set attributes relative to the metrics.
 
@@ -1,9 +1,11 @@
 import time
 import datetime
-import copy
+import types
+from collections.abc import Mapping
 import numpy as np
+import torch
 from dataclasses import dataclass, field
-from typing import List, Any
+from typing import Any
 import warnings
 
 
@@ -12,6 +14,8 @@ class Callback:
     Abstract base class used to build new callbacks.
     """
 
+    __slots__ = ("params", "trainer")
+
     def __init__(self):
         pass
 
@@ -21,6 +25,15 @@ class Callback:
     def set_trainer(self, model):
         self.trainer = model
 
+    def __getattr__(self, name):
+        # only reached when params was not set on the callback itself :
+        # the params are shared through the trainer's CallbackContainer
+        if name == "params":
+            return self.trainer._callback_container.params
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
+
     def on_epoch_begin(self, epoch, logs=None):
         pass
 
@@ -40,59 +53,112 @@ class Callback:
         pass
 
 
-@dataclass
+class BatchLog(Mapping):
+    """
+    Logs of one training batch, given to the on_batch_end hooks.
+    Fields are read as attributes, or as keys like a read-only dict.
+    """
+
+    __slots__ = ("batch_size", "loss")
+
+    def __init__(self, batch_size, loss):
+        self.batch_size = batch_size
+        self.loss = loss
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"BatchLog(batch_size={self.batch_size}, loss={self.loss})"
+
+
 class CallbackContainer:
     """
     Container holding a list of callbacks.
     """
 
-    callbacks: List[Callback] = field(default_factory=list)
+    __slots__ = (
+        "callbacks",
+        "params",
+        "trainer",
+        "_epoch_begin_fns",
+        "_epoch_end_fns",
+        "_batch_begin_fns",
+        "_batch_end_fns",
+        "_train_begin_fns",
+        "_train_end_fns",
+    )
+
+    def __init__(self, callbacks=None):
+        self.callbacks = list(callbacks or [])
+        self._refresh_hooks()
+
+    def _refresh_hooks(self):
+        # bound methods are looked up once here, not at every dispatch
+        self._epoch_begin_fns = self._overridden("on_epoch_begin")
+        self._epoch_end_fns = self._overridden("on_epoch_end")
+        self._batch_begin_fns = self._overridden("on_batch_begin")
+        self._batch_end_fns = self._overridden("on_batch_end")
+        self._train_begin_fns = self._overridden("on_train_begin")
+        self._train_end_fns = self._overridden("on_train_end")
+
+    def _overridden(self, hook_name):
+        """Bound hooks of the callbacks which do not keep the Callback no-op."""
+        noop = getattr(Callback, hook_name)
+        fns = [getattr(callback, hook_name) for callback in self.callbacks]
+        return [fn for fn in fns if getattr(fn, "__func__", None) is not noop]
 
     def append(self, callback):
         self.callbacks.append(callback)
+        self._refresh_hooks()
 
     def set_params(self, params):
-        for callback in self.callbacks:
-            callback.set_params(params)
+        # stored once, callbacks read it through Callback.params
+        self.params = params
 
     def set_trainer(self, trainer):
         self.trainer = trainer
         for callback in self.callbacks:
             callback.set_trainer(trainer)
+        self._refresh_hooks()
 
-    def on_epoch_begin(self, epoch, logs=None):
-        logs = logs or {}
-        for callback in self.callbacks:
-            callback.on_epoch_begin(epoch, logs)
+    def on_epoch_begin(self, epoch, logs):
+        for fn in self._epoch_begin_fns:
+            fn(epoch, logs)
 
-    def on_epoch_end(self, epoch, logs=None):
-        logs = logs or {}
-        for callback in self.callbacks:
-            callback.on_epoch_end(epoch, logs)
+    def on_epoch_end(self, epoch, logs):
+        for fn in self._epoch_end_fns:
+            fn(epoch, logs)
 
-    def on_batch_begin(self, batch, logs=None):
-        logs = logs or {}
-        for callback in self.callbacks:
-            callback.on_batch_begin(batch, logs)
+    def on_batch_begin(self, batch, logs):
+        for fn in self._batch_begin_fns:
+            fn(batch, logs)
 
-    def on_batch_end(self, batch, logs=None):
-        logs = logs or {}
-        for callback in self.callbacks:
-            callback.on_batch_end(batch, logs)
+    def on_batch_end(self, batch, logs):
+        for fn in self._batch_end_fns:
+            fn(batch, logs)
 
     def on_train_begin(self, logs=None):
         logs = logs or {}
         logs["start_time"] = time.time()
-        for callback in self.callbacks:
-            callback.on_train_begin(logs)
+        for fn in self._train_begin_fns:
+            fn(logs)
 
     def on_train_end(self, logs=None):
         logs = logs or {}
-        for callback in self.callbacks:
-            callback.on_train_end(logs)
+        for fn in self._train_end_fns:
+            fn(logs)
 
 
-@dataclass
+@dataclass(slots=True)
 class EarlyStopping(Callback):
     """EarlyStopping callback to exit the training loop if early_stopping_metric
     does not improve by a certain amount for a certain
@@ -115,62 +181,95 @@ class EarlyStopping(Callback):
     is_maximize: bool
     tol: float = 0.0
     patience: int = 5
+    # training state, set in __post_init__
+    best_epoch: int = field(init=False, repr=False)
+    stopped_epoch: int = field(init=False, repr=False)
+    wait: int = field(init=False, repr=False)
+    best_weights: Any = field(init=False, repr=False)
+    _copy_events: list = field(init=False, repr=False)
+    best_loss: float = field(init=False, repr=False)
+    _sign: float = field(init=False, repr=False)
+    _threshold: float = field(init=False, repr=False)
 
     def __post_init__(self):
         self.best_epoch = 0
         self.stopped_epoch = 0
         self.wait = 0
         self.best_weights = None
+        self._copy_events = []
         self.best_loss = np.inf
         if self.is_maximize:
             self.best_loss = -self.best_loss
-        super().__init__()
+        # improvements are positive once multiplied by this sign
+        self._sign = 1.0 if self.is_maximize else -1.0
+        # signed score to exceed for an improvement, updated with best_loss
+        self._threshold = self._sign * self.best_loss + self.tol
+        # zero-argument super() does not work in slots dataclasses
+        Callback.__init__(self)
 
     def on_epoch_end(self, epoch, logs=None):
         current_loss = logs.get(self.early_stopping_metric)
         if current_loss is None:
             return
 
-        loss_change = current_loss - self.best_loss
-        max_improved = self.is_maximize and loss_change > self.tol
-        min_improved = (not self.is_maximize) and (-loss_change > self.tol)
-        if max_improved or min_improved:
+        if self._sign * current_loss > self._threshold:
             self.best_loss = current_loss
+            self._threshold = self._sign * current_loss + self.tol
             self.best_epoch = epoch
-            self.wait = 1
-            self.best_weights = copy.deepcopy(self.trainer.network.state_dict())
+            self.wait = 0
+            state_dict = self.trainer.network.state_dict()
+            if self.best_weights is None:
+                # cpu buffers reused by every snapshot, pinned for cuda tensors
+                # so that their copies are asynchronous
+                self.best_weights = {
+                    name: torch.empty_like(
+                        tensor, device="cpu", pin_memory=tensor.is_cuda
+                    )
+                    for name, tensor in state_dict.items()
+                }
+            cuda_devices = set()
+            for name, tensor in state_dict.items():
+                self.best_weights[name].copy_(tensor, non_blocking=True)
+                if tensor.is_cuda:
+                    cuda_devices.add(tensor.device)
+            # marks the end of the copies on the stream of each device
+            self._copy_events = []
+            for device in cuda_devices:
+                event = torch.cuda.Event()
+                event.record(torch.cuda.current_stream(device))
+                self._copy_events.append(event)
         else:
+            self.wait += 1
             if self.wait >= self.patience:
                 self.stopped_epoch = epoch
                 self.trainer._stop_training = True
-            self.wait += 1
 
     def on_train_end(self, logs=None):
         self.trainer.best_epoch = self.best_epoch
         self.trainer.best_cost = self.best_loss
 
         if self.best_weights is not None:
+            # wait for the last asynchronous snapshot
+            for event in self._copy_events:
+                event.synchronize()
             self.trainer.network.load_state_dict(self.best_weights)
 
+        best_msg = (
+            f"with best_epoch = {self.best_epoch} and "
+            f"best_{self.early_stopping_metric} = {round(self.best_loss, 5)}"
+        )
         if self.stopped_epoch > 0:
-            msg = f"\nEarly stopping occurred at epoch {self.stopped_epoch}"
-            msg += (
-                f" with best_epoch = {self.best_epoch} and "
-                + f"best_{self.early_stopping_metric} = {round(self.best_loss, 5)}"
-            )
-            print(msg)
+            print(f"\nEarly stopping occurred at epoch {self.stopped_epoch} {best_msg}")
         else:
-            msg = (
-                f"Stop training because you reached max_epochs = {self.trainer.max_epochs}"
-                + f" with best_epoch = {self.best_epoch} and "
-                + f"best_{self.early_stopping_metric} = {round(self.best_loss, 5)}"
+            print(
+                f"Stop training because you reached max_epochs = {self.trainer.max_epochs} "
+                f"{best_msg}"
             )
-            print(msg)
         wrn_msg = "Best weights from best epoch are automatically used!"
         warnings.warn(wrn_msg)
 
 
-@dataclass
+@dataclass(slots=True)
 class History(Callback):
     """Callback that records events into a `History` object.
     This callback is automatically applied to
@@ -185,64 +284,99 @@ class History(Callback):
 
     trainer: Any
     verbose: int = 1
+    # training state, set in __post_init__ and on_train_begin
+    samples_seen: float = field(init=False, repr=False)
+    total_time: float = field(init=False, repr=False)
+    history: dict = field(init=False, repr=False)
+    start_time: float = field(init=False, repr=False)
+    epoch_loss: float = field(init=False, repr=False)
+    epoch_metrics: dict = field(init=False, repr=False)
+    _epoch_idx: int = field(init=False, repr=False)
+    _t0: float = field(init=False, repr=False)
+    _batch_sizes: Any = field(init=False, repr=False)
+    _batch_losses: Any = field(init=False, repr=False)
+    _n_batches: int = field(init=False, repr=False)
 
     def __post_init__(self):
-        super().__init__()
+        Callback.__init__(self)
         self.samples_seen = 0.0
         self.total_time = 0.0
 
     def on_train_begin(self, logs=None):
-        self.history = {"loss": []}
-        self.history.update({"lr": []})
-        self.history.update({name: [] for name in self.trainer._metrics_names})
+        # one preallocated row per epoch, filled up to self._epoch_idx,
+        # epochs which are not trained stay NaN
+        n_epochs = self.trainer.max_epochs
+        names = ["loss", "lr"] + list(self.trainer._metrics_names)
+        self.history = {
+            name: np.full(n_epochs, np.nan, dtype=np.float32) for name in names
+        }
+        self._epoch_idx = 0
         self.start_time = logs["start_time"]
+        # elapsed time is measured on a clock that wall-clock jumps don't affect
+        self._t0 = time.monotonic()
         self.epoch_loss = 0.0
+        # per batch records of the current epoch, grown on demand
+        self._batch_sizes = np.empty(64, dtype=np.float64)
+        self._batch_losses = np.empty(64, dtype=np.float64)
 
     def on_epoch_begin(self, epoch, logs=None):
         self.epoch_metrics = {"loss": 0.0}
         self.samples_seen = 0.0
+        self._n_batches = 0
 
     def on_epoch_end(self, epoch, logs=None):
+        batch_sizes = self._batch_sizes[: self._n_batches]
+        self.samples_seen = float(batch_sizes.sum())
+        if self.samples_seen:
+            batch_losses = self._batch_losses[: self._n_batches]
+            self.epoch_loss = float(np.dot(batch_sizes, batch_losses)) / self.samples_seen
+        else:
+            self.epoch_loss = 0.0
         self.epoch_metrics["loss"] = self.epoch_loss
         for metric_name, metric_value in self.epoch_metrics.items():
-            self.history[metric_name].append(metric_value)
-        if self.verbose == 0:
+            self.history[metric_name][self._epoch_idx] = metric_value
+        self._epoch_idx += 1
+        if not self.verbose or epoch % self.verbose:
             return
-        if epoch % self.verbose != 0:
-            return
-        msg = f"epoch {epoch:<3}"
-        for metric_name, metric_value in self.epoch_metrics.items():
-            if metric_name != "lr":
-                msg += f"| {metric_name:<3}: {np.round(metric_value, 5):<8}"
-        self.total_time = int(time.time() - self.start_time)
-        msg += f"|  {str(datetime.timedelta(seconds=self.total_time)) + 's':<6}"
-        print(msg)
+        metrics_msg = "".join(
+            f"| {metric_name:<3}: {round(float(metric_value), 5):<8}"
+            for metric_name, metric_value in self.epoch_metrics.items()
+            if metric_name != "lr"
+        )
+        self.total_time = int(time.monotonic() - self._t0)
+        time_msg = str(datetime.timedelta(seconds=self.total_time)) + "s"
+        print(f"epoch {epoch:<3}{metrics_msg}|  {time_msg:<6}")
 
     def on_batch_end(self, batch, logs=None):
-        batch_size = logs["batch_size"]
-        self.epoch_loss = (
-            self.samples_seen * self.epoch_loss + batch_size * logs["loss"]
-        ) / (self.samples_seen + batch_size)
-        self.samples_seen += batch_size
+        idx = self._n_batches
+        if idx == len(self._batch_sizes):
+            # only the first epoch grows the arrays, later ones reuse them
+            self._batch_sizes = np.concatenate([self._batch_sizes] * 2)
+            self._batch_losses = np.concatenate([self._batch_losses] * 2)
+        # the weighted mean is only computed at the end of the epoch
+        self._batch_sizes[idx] = logs.batch_size
+        self._batch_losses[idx] = logs.loss
+        self._n_batches = idx + 1
 
     def __getitem__(self, name):
-        return self.history[name]
+        # view on the preallocated array, no copy
+        return self.history[name][: self._epoch_idx]
 
     def __repr__(self):
-        return str(self.history)
+        return f"History(epochs={self._epoch_idx}, metrics={list(self.history)})"
 
     def __str__(self):
-        return str(self.history)
+        return self.__repr__()
 
 
-@dataclass
+@dataclass(slots=True)
 class LRSchedulerCallback(Callback):
     """Wrapper for most torch scheduler functions.
     Parameters
     ---------
     scheduler_fn : torch.optim.lr_scheduler
         Torch scheduling class
-    scheduler_params : dict
+    scheduler_params : dict (default = {})
         Dictionnary containing all parameters for the scheduler_fn
     is_batch_level : bool (default = False)
         If set to False : lr updates will happen at every epoch
@@ -252,31 +386,44 @@ class LRSchedulerCallback(Callback):
 
     scheduler_fn: Any
     optimizer: Any
-    scheduler_params: dict
     early_stopping_metric: str
+    scheduler_params: dict = field(default_factory=dict)
     is_batch_level: bool = False
+    scheduler: Any = field(init=False, repr=False)
+    is_metric_related: bool = field(init=False, repr=False)
+    _scheduler_step: Any = field(init=False, repr=False, compare=False)
+    # hooks bound in __post_init__
+    on_batch_end: Any = field(init=False, repr=False, compare=False)
+    on_epoch_end: Any = field(init=False, repr=False, compare=False)
 
     def __post_init__(
         self,
     ):
         self.is_metric_related = hasattr(self.scheduler_fn, "is_better")
         self.scheduler = self.scheduler_fn(self.optimizer, **self.scheduler_params)
-        super().__init__()
-
-    def on_batch_end(self, batch, logs=None):
+        self._scheduler_step = self.scheduler.step
+        # the stepping level is fixed for the run, bind the hooks once :
+        # a hook left to the Callback no-op is skipped by CallbackContainer
+        self.on_batch_end = types.MethodType(Callback.on_batch_end, self)
+        self.on_epoch_end = types.MethodType(Callback.on_epoch_end, self)
         if self.is_batch_level:
-            self.scheduler.step()
+            self.on_batch_end = self._batch_step
+        elif self.is_metric_related:
+            self.on_epoch_end = self._epoch_metric_step
         else:
-            pass
+            self.on_epoch_end = self._epoch_step
+        Callback.__init__(self)
 
-    def on_epoch_end(self, epoch, logs=None):
+    def _batch_step(self, batch, logs=None):
+        self._scheduler_step()
+
+    def _epoch_metric_step(self, epoch, logs=None):
         current_loss = logs.get(self.early_stopping_metric)
         if current_loss is None:
             return
-        if self.is_batch_level:
-            pass
-        else:
-            if self.is_metric_related:
-                self.scheduler.step(current_loss)
-            else:
-                self.scheduler.step()
\ No newline at end of file
+        self._scheduler_step(current_loss)
+
+    def _epoch_step(self, epoch, logs=None):
+        if logs.get(self.early_stopping_metric) is None:
+            return
+        self._scheduler_step()
\ No newline at end of file
@@ -0,0 +1,106 @@
+from contextlib import nullcontext
+from torch.nn.parallel import DistributedDataParallel
+from torch.nn.utils import clip_grad_norm_
+
+
+def wrap_ddp(network, **ddp_params):
+    """
+    Wrap a TabNet network in DistributedDataParallel.
+
+    Gradients are bucket views by default, which saves a copy of every
+    gradient bucket at each allreduce.
+
+    Parameters
+    ----------
+    network : torch.nn.Module
+        TabNet network, already on its device
+    ddp_params : dict
+        Extra parameters for torch.nn.parallel.DistributedDataParallel
+
+    Returns
+    -------
+    torch.nn.parallel.DistributedDataParallel
+        Wrapped network
+    """
+    ddp_params.setdefault("gradient_as_bucket_view", True)
+    return DistributedDataParallel(network, **ddp_params)
+
+
+class TabNetTrainer:
+    """
+    Training step with gradient accumulation for a TabNet network.
+
+    When the network is wrapped in DistributedDataParallel, gradients of
+    accumulation steps are kept local with no_sync(), so a single allreduce
+    happens per optimizer step.
+
+    Parameters
+    ----------
+    network : torch.nn.Module
+        TabNet network, possibly wrapped with wrap_ddp
+    optimizer : torch.optim.Optimizer
+        Optimizer of the network parameters
+    loss_fn : callable
+        Loss function called as loss_fn(output, y)
+    lambda_sparse : float
+        Weight of the sparsity loss
+    accumulation_steps : int
+        Number of micro batches per optimizer step
+    clip_value : float or None
+        Max gradient norm, no clipping if None or 0
+    """
+
+    def __init__(
+        self,
+        network,
+        optimizer,
+        loss_fn,
+        lambda_sparse=1e-3,
+        accumulation_steps=1,
+        clip_value=None,
+    ):
+        self.network = network
+        self.optimizer = optimizer
+        self.loss_fn = loss_fn
+        self.lambda_sparse = lambda_sparse
+        self.accumulation_steps = accumulation_steps
+        self.clip_value = clip_value
+
+    def step(self, X, y, is_accum_step):
+        """
+        Run forward and backward passes on one micro batch.
+
+        Parameters
+        ----------
+        X : torch.Tensor
+            Input batch, on the network device
+        y : torch.Tensor
+            Target batch, on the network device
+        is_accum_step : bool
+            If True, gradients are only accumulated : no allreduce and no
+            optimizer step
+
+        Returns
+        -------
+        float
+            Loss of the micro batch
+        """
+        if is_accum_step and hasattr(self.network, "no_sync"):
+            ctx = self.network.no_sync()
+        else:
+            ctx = nullcontext()
+
+        with ctx:
+            output, M_loss = self.network(X)
+            loss = self.loss_fn(output, y)
+            # Add the overall sparsity loss
+            loss = loss - self.lambda_sparse * M_loss
+            (loss / self.accumulation_steps).backward()
+
+        if not is_accum_step:
+            if self.clip_value:
+                clip_grad_norm_(self.network.parameters(), self.clip_value)
+            self.optimizer.step()
+            self.optimizer.zero_grad(set_to_none=True)
+
+        return loss.detach().item()
@@ -0,0 +1,46 @@
+import pytest
+import torch
+import torch.distributed as dist
+
+from Tabnet_network import TabNet
+from distributed import wrap_ddp, TabNetTrainer
+
+
+@pytest.fixture
+def process_group(tmp_path):
+    if not dist.is_gloo_available():
+        pytest.skip("gloo backend is not available")
+    init_file = tmp_path / "init"
+    dist.init_process_group(
+        "gloo", init_method=f"file://{init_file}", rank=0, world_size=1
+    )
+    yield
+    dist.destroy_process_group()
+
+
+def test_ddp_accumulation_steps(process_group):
+    torch.manual_seed(0)
+    network = wrap_ddp(TabNet(10, 3, n_d=8, n_a=8, n_steps=3, vbs=16))
+    optimizer = torch.optim.Adam(network.parameters(), lr=1e-2)
+    trainer = TabNetTrainer(
+        network,
+        optimizer,
+        torch.nn.functional.cross_entropy,
+        accumulation_steps=2,
+    )
+    params = [p.detach().clone() for p in network.parameters()]
+
+    # three accumulate then step cycles
+    losses = []
+    for step in range(6):
+        X = torch.rand(32, 10)
+        y = torch.randint(0, 3, (32,))
+        losses.append(trainer.step(X, y, is_accum_step=step % 2 == 0))
+
+    assert all(torch.isfinite(torch.tensor(losses)))
+    assert any(
+        not torch.equal(before, after.detach())
+        for before, after in zip(params, network.parameters())
+    )
+    # gradients are reset after each optimizer step
+    assert all(p.grad is None for p in network.parameters())